@@ -77,3 +77,6 @@ def deletar_ideia(projeto_id):
     except Exception as e:
         st.error(f"Erro ao deletar: {e}")
         return False
+
+def registrar_uso_llm(registro):
+    db.collection("llm_usage").document().set(registro)
@@ -1,19 +1,38 @@
 import streamlit as st
 from langchain_google_genai import ChatGoogleGenerativeAI
+from services import roteador
 
-def get_chat_model():
+def api_configurada():
+    return "google" in st.secrets
+
+def get_chat_model(papel="chat", local=None, modelo=None):
     try:
-        if "google" in st.secrets:
+        if api_configurada():
             api_key = st.secrets["google"]["api_key"]
-            return ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=api_key)
+            rota = roteador.obter_rota(papel, local)
+            return ChatGoogleGenerativeAI(
+                model=modelo or rota["modelo"],
+                google_api_key=api_key,
+                timeout=rota["orcamento_s"],
+                max_retries=1 # Quem cuida do fallback é o roteador
+            )
         return None
     except Exception as e:
         st.error(f"Erro IA: {e}")
         return None
 
+def invocar(papel, local, entrada):
+    """Chama o modelo da rota (local, papel) pelo roteador (fallback + métricas)."""
+    def chamada(modelo, uso):
+        resposta = get_chat_model(papel, local, modelo).invoke(entrada)
+        metadados = getattr(resposta, "usage_metadata", None) or {}
+        uso["tokens_entrada"] = metadados.get("input_tokens")
+        uso["tokens_saida"] = metadados.get("output_tokens")
+        return resposta
+    return roteador.executar(local, papel, chamada)
+
 def gerar_resumo(historico_chat, tipo_resumo):
-    llm = get_chat_model()
-    if not llm or not historico_chat: return None
+    if not api_configurada() or not historico_chat: return None
 
     texto_conversa = ""
     for msg in historico_chat:
@@ -36,6 +55,6 @@ def gerar_resumo(historico_chat, tipo_resumo):
     """
     
     try:
-        return llm.invoke(prompt).content
+        return invocar("resumo", f"resumo_{tipo_resumo}", prompt).content
     except:
         return None
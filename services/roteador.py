@@ -0,0 +1,141 @@
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+# --- ROTAS PADRÃO ---
+# Cada papel tem um modelo principal, um modelo de fallback (mais rápido) e um
+# orçamento de latência por requisição (em segundos, usado como timeout do
+# cliente HTTP). Tudo pode ser sobrescrito em st.secrets sem
+# mexer no código, por papel ou por local de chamada:
+#
+#   [roteamento]
+#   cooldown_s = 300
+#
+#   [roteamento.chefe]
+#   modelo = "gemini-2.5-pro"
+#
+#   [roteamento.equipe_micro.especialista]   # só para a equipe micro de história
+#   orcamento_s = 30
+#
+#   [roteamento.precos."gemini-2.5-pro"]     # USD por 1M de tokens
+#   entrada = 1.25
+#   saida = 10.0
+ROTAS_PADRAO = {
+    "especialista": {"modelo": "gemini-2.5-flash-lite", "fallback": "gemini-2.0-flash-lite", "orcamento_s": 60},
+    "chefe": {"modelo": "gemini-2.5-pro", "fallback": "gemini-2.5-flash", "orcamento_s": 120},
+    "chat": {"modelo": "gemini-2.5-flash", "fallback": "gemini-2.5-flash-lite", "orcamento_s": 30},
+    "resumo": {"modelo": "gemini-2.5-flash-lite", "fallback": "gemini-2.0-flash-lite", "orcamento_s": 45},
+}
+
+PRECOS_PADRAO = {
+    "gemini-2.5-pro": {"entrada": 1.25, "saida": 10.0},
+    "gemini-2.5-flash": {"entrada": 0.30, "saida": 2.50},
+    "gemini-2.5-flash-lite": {"entrada": 0.10, "saida": 0.40},
+    "gemini-2.0-flash-lite": {"entrada": 0.075, "saida": 0.30},
+}
+
+# Depois de um timeout/rate limit, a rota fica degradada (usa o fallback direto) por
+# um tempo. Configurável em [roteamento] com cooldown_s.
+COOLDOWN_S = 300
+_degradados = {}
+
+# Gravação das métricas fora da thread do usuário (não entra na latência da resposta)
+_gravador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm_usage")
+
+# --- CONFIGURAÇÃO ---
+
+def _config():
+    try:
+        if "roteamento" in st.secrets:
+            return st.secrets["roteamento"]
+    except Exception:
+        pass
+    return {}
+
+def obter_rota(papel, local=None):
+    rota = dict(ROTAS_PADRAO[papel])
+    config = _config()
+    if papel in config:
+        rota.update(config[papel])
+    if local and local in config and papel in config[local]:
+        rota.update(config[local][papel])
+    return rota
+
+def calcular_custo(modelo, tokens_entrada, tokens_saida):
+    if tokens_entrada is None or tokens_saida is None: return None
+    preco = {**PRECOS_PADRAO.get(modelo, {}), **_config().get("precos", {}).get(modelo, {})}
+    if "entrada" not in preco or "saida" not in preco: return None
+    return (tokens_entrada * preco["entrada"] + tokens_saida * preco["saida"]) / 1_000_000
+
+# --- FALLBACK ---
+
+def _erro_transitorio(erro):
+    texto = f"{type(erro).__name__} {erro}".lower()
+    marcas = ("timeout", "timed out", "deadline", "429", "rate limit", "ratelimit", "resource_exhausted", "quota")
+    return any(m in texto for m in marcas)
+
+def _em_cooldown(chave):
+    return _degradados.get(chave, 0) > time.monotonic()
+
+def executar(local, papel, chamada):
+    """
+    Roda uma chamada de modelo pela rota (local, papel) e devolve o resultado.
+    `chamada(modelo, uso)` recebe o nome do modelo e um dict onde deve anotar
+    "tokens_entrada" e "tokens_saida" (mesmo se falhar no meio).
+    Em timeout ou rate limit, só esta rota passa para o modelo de fallback.
+    """
+    rota = obter_rota(papel, local)
+    chave = (local, papel)
+    if _em_cooldown(chave):
+        return _tentar(local, papel, rota["fallback"], True, chamada)
+
+    try:
+        return _tentar(local, papel, rota["modelo"], False, chamada)
+    except Exception as e:
+        if not _erro_transitorio(e): raise
+        _degradados[chave] = time.monotonic() + float(_config().get("cooldown_s", COOLDOWN_S))
+        return _tentar(local, papel, rota["fallback"], True, chamada)
+
+def _tentar(local, papel, modelo, degradado, chamada):
+    uso = {}
+    erro = None
+    inicio = time.monotonic()
+    try:
+        return chamada(modelo, uso)
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _registrar(local, papel, modelo, degradado, time.monotonic() - inicio, uso, erro)
+
+# --- MÉTRICAS ---
+
+def _registrar(local, papel, modelo, degradado, latencia, uso, erro):
+    # Métrica nunca deve derrubar a resposta da IA
+    try:
+        tokens_entrada = uso.get("tokens_entrada")
+        tokens_saida = uso.get("tokens_saida")
+        registro = {
+            "local": local,
+            "papel": papel,
+            "modelo": modelo,
+            "degradado": degradado,
+            "erro": erro,
+            "latencia_s": round(latencia, 3),
+            "tokens_entrada": tokens_entrada,
+            "tokens_saida": tokens_saida,
+            "custo_usd": calcular_custo(modelo, tokens_entrada, tokens_saida),
+            "created_at": datetime.datetime.now()
+        }
+        _gravador.submit(_gravar, registro)
+    except Exception:
+        pass
+
+def _gravar(registro):
+    try:
+        # Import tardio: o banco inicializa o Firebase na importação
+        from services import database as db
+        db.registrar_uso_llm(registro)
+    except Exception:
+        pass
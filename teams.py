@@ -1,17 +1,69 @@
 import os
+import logging
 import streamlit as st
-from crewai import Agent, Task, Crew, Process, LLM
+from crewai import Agent, Task, Crew, Process, LLM, BaseLLM
+from services import roteador
+
+logger = logging.getLogger(__name__)
 
 # --- CONFIGURAÇÃO DO CÉREBRO ---
-def get_llm():
+# Especialistas usam a rota "especialista" (modelo barato/rápido) e o chefe
+# que consolida usa a rota "chefe" (modelo mais forte). Ver services/roteador.py.
+# Cada chamada passa pelo roteador: se uma rota estoura o orçamento ou o rate
+# limit, só ela cai para o fallback e as tarefas já concluídas não são refeitas.
+class LLMRoteado(BaseLLM):
+    def __init__(self, papel, local, api_key):
+        rota = roteador.obter_rota(papel, local)
+        super().__init__(model=f"gemini/{rota['modelo']}", temperature=0.7)
+        self.papel = papel
+        self.local = local
+        self.rota = rota
+        self.api_key = api_key
+        self._llms = {}
+
+    def _llm(self, modelo):
+        if modelo not in self._llms:
+            self._llms[modelo] = LLM(
+                model=f"gemini/{modelo}",
+                api_key=self.api_key,
+                temperature=0.7,
+                # O provedor nativo do Gemini ignora `timeout`; o orçamento vai no cliente HTTP (ms)
+                client_params={"http_options": {"timeout": int(self.rota["orcamento_s"] * 1000)}}
+            )
+        return self._llms[modelo]
+
+    def call(self, messages, *args, **kwargs):
+        def chamada(modelo, uso):
+            llm = self._llm(modelo)
+            llm.stop = self.stop
+            antes = llm.get_token_usage_summary()
+            resposta = llm.call(messages, *args, **kwargs)
+            depois = llm.get_token_usage_summary()
+            entrada = depois.prompt_tokens - antes.prompt_tokens
+            saida = depois.completion_tokens - antes.completion_tokens
+            if depois.successful_requests > antes.successful_requests and entrada + saida > 0:
+                uso["tokens_entrada"] = entrada
+                uso["tokens_saida"] = saida
+            else:
+                # Sem contagem o custo fica vazio (None), nunca zero
+                logger.warning("LLM %s não informou uso de tokens; custo não será registrado.", modelo)
+            return resposta
+        return roteador.executar(self.local, self.papel, chamada)
+
+    def supports_function_calling(self):
+        return self._llm(self.rota["modelo"]).supports_function_calling()
+
+    def supports_stop_words(self):
+        return self._llm(self.rota["modelo"]).supports_stop_words()
+
+    def get_context_window_size(self):
+        return self._llm(self.rota["modelo"]).get_context_window_size()
+
+def get_llm(papel="especialista", local=None):
     if "google" in st.secrets:
         api_key = st.secrets["google"]["api_key"]
         os.environ["GOOGLE_API_KEY"] = api_key
-        return LLM(
-            model="gemini/gemini-2.5-flash",
-            api_key=api_key,
-            temperature=0.7
-        )
+        return LLMRoteado(papel, local, api_key)
     return None
 
 # ==========================================================
@@ -19,16 +71,17 @@ def get_llm():
 # ==========================================================
 
 def rodar_equipe_macro(resumo_universo, titulo_projeto):
-    my_llm = get_llm()
-    if not my_llm: return "Erro: Chave de API não configurada."
+    llm_esp = get_llm("especialista", "equipe_macro")
+    llm_chefe = get_llm("chefe", "equipe_macro")
+    if not llm_esp: return "Erro: Chave de API não configurada."
 
     # Especialistas
-    ag_logica = Agent(role='Crítico Estrutural', goal='Identificar furos de roteiro.', backstory='Editor chato. Odeia Deus Ex Machina.', llm=my_llm, verbose=True)
-    ag_psico = Agent(role='Psicólogo de Personagens', goal='Avaliar motivações.', backstory='Analisa profundidade emocional.', llm=my_llm, verbose=True)
-    ag_mercado = Agent(role='Agente Literário', goal='Avaliar potencial de venda.', backstory='Focado em best-sellers.', llm=my_llm, verbose=True)
+    ag_logica = Agent(role='Crítico Estrutural', goal='Identificar furos de roteiro.', backstory='Editor chato. Odeia Deus Ex Machina.', llm=llm_esp, verbose=True)
+    ag_psico = Agent(role='Psicólogo de Personagens', goal='Avaliar motivações.', backstory='Analisa profundidade emocional.', llm=llm_esp, verbose=True)
+    ag_mercado = Agent(role='Agente Literário', goal='Avaliar potencial de venda.', backstory='Focado em best-sellers.', llm=llm_esp, verbose=True)
     
     # O CHEFE (NOVO)
-    ag_editor_chefe = Agent(role='Editor Chefe Sênior', goal='Consolidar todos os relatórios.', backstory='Você organiza o feedback em um plano de ação claro para o autor.', llm=my_llm, verbose=True)
+    ag_editor_chefe = Agent(role='Editor Chefe Sênior', goal='Consolidar todos os relatórios.', backstory='Você organiza o feedback em um plano de ação claro para o autor.', llm=llm_chefe, verbose=True)
 
     # Tarefas
     t_logica = Task(description=f"Universo: '{resumo_universo}'. Aponte furos de lógica.", expected_output="Lista de inconsistências.", agent=ag_logica)
@@ -47,15 +100,16 @@ def rodar_equipe_macro(resumo_universo, titulo_projeto):
     return crew.kickoff()
 
 def rodar_equipe_micro(texto_capitulo, contexto_macro):
-    my_llm = get_llm()
-    if not my_llm: return "Erro: Chave de API não encontrada."
+    llm_esp = get_llm("especialista", "equipe_micro")
+    llm_chefe = get_llm("chefe", "equipe_micro")
+    if not llm_esp: return "Erro: Chave de API não encontrada."
 
-    ag_cont = Agent(role='Fiscal de Continuidade', goal='Garantir regras do mundo.', backstory='Você briga se quebrar regras mágicas.', llm=my_llm, verbose=True)
-    ag_editor = Agent(role='Editor de Texto', goal='Melhorar prosa.', backstory='Mestre em descrições.', llm=my_llm, verbose=True)
-    ag_hater = Agent(role='Leitor Cínico', goal='Apontar tédio.', backstory='Brutalmente honesto.', llm=my_llm, verbose=True)
+    ag_cont = Agent(role='Fiscal de Continuidade', goal='Garantir regras do mundo.', backstory='Você briga se quebrar regras mágicas.', llm=llm_esp, verbose=True)
+    ag_editor = Agent(role='Editor de Texto', goal='Melhorar prosa.', backstory='Mestre em descrições.', llm=llm_esp, verbose=True)
+    ag_hater = Agent(role='Leitor Cínico', goal='Apontar tédio.', backstory='Brutalmente honesto.', llm=llm_esp, verbose=True)
     
     # O CHEFE (NOVO)
-    ag_revisor = Agent(role='Revisor Final', goal='Criar um guia de reescrita.', backstory='Você diz exatamente o que o autor deve mudar no texto.', llm=my_llm, verbose=True)
+    ag_revisor = Agent(role='Revisor Final', goal='Criar um guia de reescrita.', backstory='Você diz exatamente o que o autor deve mudar no texto.', llm=llm_chefe, verbose=True)
 
     t_cont = Task(description=f"Contexto: {contexto_macro}. Texto: {texto_capitulo}. Erros de continuidade?", expected_output="Relatório continuidade.", agent=ag_cont)
     t_editor = Task(description="Melhore a prosa e ritmo.", expected_output="Crítica técnica.", agent=ag_editor)
@@ -77,15 +131,16 @@ def rodar_equipe_micro(texto_capitulo, contexto_macro):
 # ==========================================================
 
 def rodar_equipe_negocio_macro(resumo_negocio, titulo):
-    my_llm = get_llm()
-    if not my_llm: return "Erro: Chave de API não configurada."
+    llm_esp = get_llm("especialista", "equipe_negocio_macro")
+    llm_chefe = get_llm("chefe", "equipe_negocio_macro")
+    if not llm_esp: return "Erro: Chave de API não configurada."
 
-    ag_cfo = Agent(role='CFO Estrategista', goal='Avaliar lucro.', backstory='Focado em números.', llm=my_llm, verbose=True)
-    ag_produto = Agent(role='Diretor de Produto', goal='Validar dor do cliente.', backstory='Usa Canvas.', llm=my_llm, verbose=True)
-    ag_legal = Agent(role='Consultor Jurídico', goal='Riscos legais.', backstory='Verifica leis.', llm=my_llm, verbose=True)
+    ag_cfo = Agent(role='CFO Estrategista', goal='Avaliar lucro.', backstory='Focado em números.', llm=llm_esp, verbose=True)
+    ag_produto = Agent(role='Diretor de Produto', goal='Validar dor do cliente.', backstory='Usa Canvas.', llm=llm_esp, verbose=True)
+    ag_legal = Agent(role='Consultor Jurídico', goal='Riscos legais.', backstory='Verifica leis.', llm=llm_esp, verbose=True)
     
     # O CHEFE (NOVO)
-    ag_ceo = Agent(role='CEO Interino', goal='Decidir se investe ou não.', backstory='Você consolida tudo e dá o Go/No-Go.', llm=my_llm, verbose=True)
+    ag_ceo = Agent(role='CEO Interino', goal='Decidir se investe ou não.', backstory='Você consolida tudo e dá o Go/No-Go.', llm=llm_chefe, verbose=True)
 
     t_cfo = Task(description=f"Ideia: '{titulo}' - '{resumo_negocio}'. Modelos de receita?", expected_output="Análise financeira.", agent=ag_cfo)
     t_prod = Task(description="Product-Market Fit?", expected_output="Validação de mercado.", agent=ag_produto)
@@ -102,15 +157,16 @@ def rodar_equipe_negocio_macro(resumo_negocio, titulo):
     return crew.kickoff()
 
 def rodar_equipe_negocio_micro(detalhes_tecnicos, contexto_macro):
-    my_llm = get_llm()
-    if not my_llm: return "Erro: Chave de API não configurada."
+    llm_esp = get_llm("especialista", "equipe_negocio_micro")
+    llm_chefe = get_llm("chefe", "equipe_negocio_micro")
+    if not llm_esp: return "Erro: Chave de API não configurada."
 
-    ag_ux = Agent(role='UX Designer', goal='Criticar jornada.', backstory='Defende o usuário.', llm=my_llm, verbose=True)
-    ag_qa = Agent(role='Engenheiro QA', goal='Achar falhas.', backstory='Pensa como quebra.', llm=my_llm, verbose=True)
-    ag_etica = Agent(role='Auditor Ético', goal='Garantir inclusão.', backstory='Verifica viés.', llm=my_llm, verbose=True)
+    ag_ux = Agent(role='UX Designer', goal='Criticar jornada.', backstory='Defende o usuário.', llm=llm_esp, verbose=True)
+    ag_qa = Agent(role='Engenheiro QA', goal='Achar falhas.', backstory='Pensa como quebra.', llm=llm_esp, verbose=True)
+    ag_etica = Agent(role='Auditor Ético', goal='Garantir inclusão.', backstory='Verifica viés.', llm=llm_esp, verbose=True)
     
     # O CHEFE (NOVO)
-    ag_pm = Agent(role='Project Manager Técnico', goal='Criar backlog de correções.', backstory='Transforma problemas em tarefas.', llm=my_llm, verbose=True)
+    ag_pm = Agent(role='Project Manager Técnico', goal='Criar backlog de correções.', backstory='Transforma problemas em tarefas.', llm=llm_chefe, verbose=True)
 
     t_ux = Task(description=f"Contexto: {contexto_macro}. Detalhes: '{detalhes_tecnicos}'. Crítica UX.", expected_output="Crítica UX.", agent=ag_ux)
     t_qa = Task(description="Riscos técnicos?", expected_output="Relatório riscos.", agent=ag_qa)
@@ -132,15 +188,16 @@ def rodar_equipe_negocio_micro(detalhes_tecnicos, contexto_macro):
 # ==========================================================
 
 def rodar_equipe_fisico_macro(resumo_obra, titulo):
-    my_llm = get_llm()
-    if not my_llm: return "Erro."
+    llm_esp = get_llm("especialista", "equipe_fisico_macro")
+    llm_chefe = get_llm("chefe", "equipe_fisico_macro")
+    if not llm_esp: return "Erro."
 
-    ag_incorp = Agent(role='Incorporador', goal='Avaliar ROI.', backstory='Focado em retorno.', llm=my_llm, verbose=True)
-    ag_ops = Agent(role='Estrategista Ops', goal='Validar logística.', backstory='Focado em fluxo.', llm=my_llm, verbose=True)
-    ag_legal = Agent(role='Advogado Imobiliário', goal='Verificar zoneamento.', backstory='Leis e alvarás.', llm=my_llm, verbose=True)
+    ag_incorp = Agent(role='Incorporador', goal='Avaliar ROI.', backstory='Focado em retorno.', llm=llm_esp, verbose=True)
+    ag_ops = Agent(role='Estrategista Ops', goal='Validar logística.', backstory='Focado em fluxo.', llm=llm_esp, verbose=True)
+    ag_legal = Agent(role='Advogado Imobiliário', goal='Verificar zoneamento.', backstory='Leis e alvarás.', llm=llm_esp, verbose=True)
     
     # O CHEFE (NOVO)
-    ag_diretor = Agent(role='Diretor de Novos Negócios', goal='Aprovar a compra do terreno.', backstory='Analisa risco x retorno global.', llm=my_llm, verbose=True)
+    ag_diretor = Agent(role='Diretor de Novos Negócios', goal='Aprovar a compra do terreno.', backstory='Analisa risco x retorno global.', llm=llm_chefe, verbose=True)
 
     t_incorp = Task(description=f"Empreendimento: '{titulo}'. Resumo: '{resumo_obra}'. Viabilidade?", expected_output="Análise imobiliária.", agent=ag_incorp)
     t_ops = Task(description="Logística macro?", expected_output="Análise operacional.", agent=ag_ops)
@@ -157,15 +214,16 @@ def rodar_equipe_fisico_macro(resumo_obra, titulo):
     return crew.kickoff()
 
 def rodar_equipe_fisico_micro(planta_detalhes, contexto_macro):
-    my_llm = get_llm()
-    if not my_llm: return "Erro: Chave de API não configurada."
+    llm_esp = get_llm("especialista", "equipe_fisico_micro")
+    llm_chefe = get_llm("chefe", "equipe_fisico_micro")
+    if not llm_esp: return "Erro: Chave de API não configurada."
 
-    ag_xp = Agent(role='Arquiteto XP', goal='Criticar conforto.', backstory='Acústica e luz.', llm=my_llm, verbose=True)
-    ag_fiscal = Agent(role='Consultor Normas', goal='Evitar multas.', backstory='Bombeiros e ANVISA.', llm=my_llm, verbose=True)
-    ag_rh = Agent(role='Gerente RH', goal='Vida do funcionário.', backstory='Ergonomia.', llm=my_llm, verbose=True)
+    ag_xp = Agent(role='Arquiteto XP', goal='Criticar conforto.', backstory='Acústica e luz.', llm=llm_esp, verbose=True)
+    ag_fiscal = Agent(role='Consultor Normas', goal='Evitar multas.', backstory='Bombeiros e ANVISA.', llm=llm_esp, verbose=True)
+    ag_rh = Agent(role='Gerente RH', goal='Vida do funcionário.', backstory='Ergonomia.', llm=llm_esp, verbose=True)
     
     # O CHEFE (NOVO)
-    ag_gerente = Agent(role='Gerente Geral', goal='Preparar a inauguração.', backstory='Garante que a operação vai rodar liso.', llm=my_llm, verbose=True)
+    ag_gerente = Agent(role='Gerente Geral', goal='Preparar a inauguração.', backstory='Garante que a operação vai rodar liso.', llm=llm_chefe, verbose=True)
 
     t_xp = Task(description=f"Contexto: {contexto_macro}. Detalhes: '{planta_detalhes}'. Crítica sensorial.", expected_output="Crítica sensorial.", agent=ag_xp)
     t_fiscal = Task(description="Riscos legais físicos?", expected_output="Relatório normas.", agent=ag_fiscal)
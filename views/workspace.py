@@ -28,16 +28,15 @@ def render_chat(projeto, campo_banco, system_prompt, key_suffix):
             st.chat_message(role, avatar=avatar).write(msg.content)
 
     # Input do usuário
-    chat_model = llm.get_chat_model()
     if prompt := st.chat_input(f"Fale com o {key_suffix}...", key=f"input_{key_suffix}"):
-        if not chat_model: return
+        if not llm.api_configurada(): return
 
         # Adiciona msg do usuário
         st.session_state[session_key].append(HumanMessage(content=prompt))
         
         # Roda a IA
         messages = [HumanMessage(content=system_prompt)] + st.session_state[session_key]
-        response = chat_model.invoke(messages)
+        response = llm.invocar("chat", f"chat_{key_suffix}", messages)
         
         # Adiciona resposta da IA
         st.session_state[session_key].append(AIMessage(content=response.content))